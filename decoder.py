@@ -1,13 +1,88 @@
 import numpy as np
 from PIL import Image, ImageFile
+from concurrent.futures import ThreadPoolExecutor
 import os
 import argparse
+import struct
 import sys
+import threading
+import zlib
 
 # Disable decompression bomb check and truncated image warnings
 Image.MAX_IMAGE_PIXELS = None
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+# 15-byte header/footer block layouts; multi-byte integers are big-endian
+HEADER_DTYPE = np.dtype([('name', 'S5'), ('ext', 'S4'), ('size', '3u1'), ('blocks', '3u1')])
+FOOTER_DTYPE = np.dtype([('name', 'S5'), ('ext', 'S4'), ('checksum', '6u1')])
+
+# Byte weights for reassembling big-endian integers from u1 fields
+_BE_WEIGHTS = 256 ** np.arange(5, -1, -1, dtype=np.int64)
+
+# Numba is optional; without it the decoder falls back to the NumPy path
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+_NUMBA_LOCK = threading.Lock()
+
+if HAVE_NUMBA:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _decode_blocks(img, xs, ys, regions, out):
+        """Sum each sampling region of every block into its output bytes"""
+        for b in prange(len(xs)):
+            for k in range(regions.shape[0]):
+                x1 = xs[b] + regions[k, 0]
+                y1 = ys[b] + regions[k, 1]
+                x2 = xs[b] + regions[k, 2]
+                y2 = ys[b] + regions[k, 3]
+                r_sum = 0
+                g_sum = 0
+                b_sum = 0
+                for yy in range(y1, y2):
+                    for xx in range(x1, x2):
+                        r_sum += img[yy, xx, 0]
+                        g_sum += img[yy, xx, 1]
+                        b_sum += img[yy, xx, 2]
+                count = (y2 - y1) * (x2 - x1)
+                out[b, 3 * k] = r_sum // count
+                out[b, 3 * k + 1] = g_sum // count
+                out[b, 3 * k + 2] = b_sum // count
+
+    @njit(cache=True)
+    def _unfilter_row(ftype, row, prev):
+        """Reverse a PNG scanline filter in place (8-bit RGB, bpp = 3)"""
+        bpp = 3
+        n = len(row)
+        if ftype == 1:  # Sub
+            for i in range(bpp, n):
+                row[i] = (int(row[i]) + int(row[i - bpp])) & 0xFF
+        elif ftype == 2:  # Up
+            for i in range(n):
+                row[i] = (int(row[i]) + int(prev[i])) & 0xFF
+        elif ftype == 3:  # Average
+            for i in range(n):
+                a = int(row[i - bpp]) if i >= bpp else 0
+                row[i] = (int(row[i]) + ((a + int(prev[i])) >> 1)) & 0xFF
+        elif ftype == 4:  # Paeth
+            for i in range(n):
+                a = int(row[i - bpp]) if i >= bpp else 0
+                b = int(prev[i])
+                c = int(prev[i - bpp]) if i >= bpp else 0
+                p = a + b - c
+                pa = abs(p - a)
+                pb = abs(p - b)
+                pc = abs(p - c)
+                if pa <= pb and pa <= pc:
+                    pred = a
+                elif pb <= pc:
+                    pred = b
+                else:
+                    pred = c
+                row[i] = (row[i] + pred) & 0xFF
+
 class ByteBlockDecoder:
     def __init__(self):
         self.DPI = 2550
@@ -18,70 +93,123 @@ class ByteBlockDecoder:
         self.BLOCK_HEIGHT = 300
         self.INNER_SCALE = 0.7071067811865476  # sqrt(0.5)
 
-    def get_average_color(self, img_array, region):
-        """Get average color of a region, avoiding edges"""
-        x1, y1, x2, y2 = region
-        # Sample from center area of region to avoid edge artifacts
+        # The block geometry is fixed, so derive the sampling rectangles
+        # (inset by the 5px edge margin) once instead of per call
         margin = 5
-        sample_area = img_array[y1+margin:y2-margin, x1+margin:x2-margin]
-        if sample_area.size == 0:
-            return (0, 0, 0)
-        return tuple(np.mean(sample_area, axis=(0, 1)).astype(int))
+        self.SAMPLE_REGIONS = np.array(
+            [(x1 + margin, y1 + margin, x2 - margin, y2 - margin)
+             for x1, y1, x2, y2 in self.block_regions()], dtype=np.int64)
 
-    def extract_colors(self, img_array, x, y):
-        """Extract colors from the five sections of a block using region averaging"""
+    def block_regions(self):
+        """Sampling regions for the five sections of a block, relative to its origin"""
         width = self.BLOCK_WIDTH
         height = self.BLOCK_HEIGHT
-        
+
         # Calculate inner rectangle dimensions
         inner_width = int(width * self.INNER_SCALE)
         inner_height = int(height * self.INNER_SCALE)
-        inner_x = x + (width - inner_width) // 2
-        inner_y = y + (height - inner_height) // 2
+        inner_x = (width - inner_width) // 2
+        inner_y = (height - inner_height) // 2
 
-        # Define regions for color sampling
-        regions = [
+        return [
             # Top trapezoid: middle section
-            (x + width//4, y, x + 3*width//4, inner_y),
+            (width//4, 0, 3*width//4, inner_y),
             # Bottom trapezoid: middle section
-            (x + width//4, inner_y + inner_height, x + 3*width//4, y + height),
+            (width//4, inner_y + inner_height, 3*width//4, height),
             # Right trapezoid: middle section
-            (inner_x + inner_width, y + height//4, x + width, y + 3*height//4),
+            (inner_x + inner_width, height//4, width, 3*height//4),
             # Left trapezoid: middle section
-            (x, y + height//4, inner_x, y + 3*height//4),
+            (0, height//4, inner_x, 3*height//4),
             # Inner rectangle: center area
-            (inner_x + inner_width//4, inner_y + inner_height//4, 
+            (inner_x + inner_width//4, inner_y + inner_height//4,
              inner_x + 3*inner_width//4, inner_y + 3*inner_height//4)
         ]
 
-        return [self.get_average_color(img_array, region) for region in regions]
+    def extract_colors(self, img_array, xs, ys):
+        """Extract the five region-average colors for every block at once.
+
+        xs and ys are (N,) arrays of block origins; returns an (N, 5, 3)
+        uint8 array of colors, one 15-byte block per row once flattened.
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        colors = np.empty((len(xs), 5, 3), dtype=np.uint8)
+        regions = self.SAMPLE_REGIONS
+
+        if HAVE_NUMBA:
+            out = colors.reshape(len(xs), 15)
+            # Numba's threading layer is not re-entrant; the kernel already
+            # parallelizes over blocks, so serializing callers costs nothing.
+            with _NUMBA_LOCK:
+                _decode_blocks(img_array, xs.astype(np.int64), ys.astype(np.int64),
+                               regions, out)
+            return colors
+
+        # Build a summed-area table one grid row band at a time (a full-page
+        # table would not fit in memory); each region mean then costs four
+        # lookups and a subtraction, independent of region size.
+        def sample_band(y0):
+            sel = np.nonzero(ys == y0)[0]
+            band = img_array[y0:y0 + self.BLOCK_HEIGHT]
+            # A band sums to at most 255 * 300 * width < 2**32, so build the
+            # table at uint32 straight from the uint8 view instead of letting
+            # cumsum promote to int64 (half the memory traffic, no cast copy)
+            sat = np.zeros((band.shape[0] + 1, band.shape[1] + 1, 3), dtype=np.uint32)
+            sat[1:, 1:] = band.cumsum(axis=0, dtype=np.uint32).cumsum(axis=1)
+
+            bx = xs[sel]
+            for k, (x1, y1, x2, y2) in enumerate(regions):
+                area = (y2 - y1) * (x2 - x1)
+                # Unsigned intermediates may wrap, but the final value is the
+                # true nonnegative region sum modulo 2**32, hence exact
+                total = (sat[y2, bx + x2] - sat[y1, bx + x2]
+                         - sat[y2, bx + x1] + sat[y1, bx + x1])
+                colors[sel, k] = (total // area).astype(np.uint8)
+
+        # Bands are independent and the cumsum releases the GIL, so decode
+        # them in parallel when there is more than one.
+        bands = np.unique(ys)
+        if len(bands) > 1:
+            with ThreadPoolExecutor() as pool:
+                list(pool.map(sample_band, bands))
+        else:
+            for y0 in bands:
+                sample_band(y0)
+
+        return colors
+
+    def block_origins(self, indices, blocks_per_row):
+        """Pixel origins of the blocks at the given grid indices"""
+        rows, cols = np.divmod(np.asarray(indices), blocks_per_row)
+        xs = self.MARGIN + cols * (self.BLOCK_WIDTH + self.MARGIN)
+        ys = self.MARGIN + rows * (self.BLOCK_HEIGHT + self.MARGIN)
+        return xs, ys
 
-    def colors_to_bytes(self, colors):
-        """Convert RGB colors to bytes"""
-        bytes_data = bytearray()
-        for color in colors:
-            bytes_data.extend(color)
-        return bytes_data
+    def check_bounds(self, img_array, xs, ys):
+        """Ensure every block to be sampled lies inside the image.
+
+        The grid positions come from the page's own (unverified) header, so
+        they must be range-checked before indexing - the Numba kernel does
+        no bounds checking of its own."""
+        if len(xs) == 0:
+            return
+        if (int(np.max(ys)) + self.BLOCK_HEIGHT > img_array.shape[0]
+                or int(np.max(xs)) + self.BLOCK_WIDTH > img_array.shape[1]):
+            raise ValueError("Image too small for the expected block grid - not an encoded page?")
 
     def parse_header(self, header_bytes):
         """Parse 15-byte header block"""
         try:
-            # First 5 bytes: filename start
-            filename = bytes(header_bytes[:5]).decode('utf-8', errors='ignore').rstrip('\x00')
-            
-            # Next 4 bytes: extension
-            extension = bytes(header_bytes[5:9]).decode('utf-8', errors='ignore').rstrip('\x00')
-            
-            # 3 bytes for filesize
-            filesize = (header_bytes[9] << 16) | (header_bytes[10] << 8) | header_bytes[11]
-            
-            # 3 bytes for number of blocks
-            num_blocks = (header_bytes[12] << 16) | (header_bytes[13] << 8) | header_bytes[14]
-            
-            print(f"Debug - Raw header bytes: {[hex(b) for b in header_bytes]}")
-            print(f"Debug - Filename bytes: {[hex(b) for b in header_bytes[:5]]}")
-            print(f"Debug - Extension bytes: {[hex(b) for b in header_bytes[5:9]]}")
-            
+            fields = np.frombuffer(bytes(header_bytes), dtype=HEADER_DTYPE)[0]
+
+            # Filename start (5 bytes) and extension (4 bytes)
+            filename = fields['name'].decode('utf-8', errors='ignore').rstrip('\x00')
+            extension = fields['ext'].decode('utf-8', errors='ignore').rstrip('\x00')
+
+            # 3 bytes each for filesize and number of blocks
+            filesize = int(fields['size'] @ _BE_WEIGHTS[3:])
+            num_blocks = int(fields['blocks'] @ _BE_WEIGHTS[3:])
+
             return filename, extension, filesize, num_blocks
         except Exception as e:
             print(f"Header parsing error: {str(e)}")
@@ -90,83 +218,136 @@ class ByteBlockDecoder:
     def verify_footer(self, footer_bytes, data, filename, extension):
         """Verify 15-byte footer block"""
         try:
+            fields = np.frombuffer(bytes(footer_bytes), dtype=FOOTER_DTYPE)[0]
+
             # Last 5 bytes of filename
-            stored_name = bytes(footer_bytes[:5]).decode('utf-8', errors='ignore').rstrip('\x00')
-            print(f"Debug - Footer name: {stored_name}")
-            print(f"Debug - Expected name end: {filename[-5:] if len(filename) >= 5 else filename}")
-            
+            stored_name = fields['name'].decode('utf-8', errors='ignore').rstrip('\x00')
             # Extension
-            stored_ext = bytes(footer_bytes[5:9]).decode('utf-8', errors='ignore').rstrip('\x00')
-            print(f"Debug - Footer extension: {stored_ext}")
-            print(f"Debug - Expected extension: {extension}")
-            
+            stored_ext = fields['ext'].decode('utf-8', errors='ignore').rstrip('\x00')
             # Checksum (6 bytes)
-            stored_checksum = int.from_bytes(footer_bytes[9:15], 'big')
-            calculated_checksum = sum(data) & 0xFFFFFFFFFFFF
-            print(f"Debug - Stored checksum: {stored_checksum}")
-            print(f"Debug - Calculated checksum: {calculated_checksum}")
-            
+            stored_checksum = int(fields['checksum'] @ _BE_WEIGHTS)
+            calculated_checksum = int(np.frombuffer(data, dtype=np.uint8).sum(dtype=np.uint64)) & 0xFFFFFFFFFFFF
             return stored_checksum == calculated_checksum
             
         except Exception as e:
             print(f"Footer verification error: {str(e)}")
             return False
 
+    def load_block_rows(self, input_file):
+        """Stream a PNG and reconstruct only the rows covered by block bands.
+
+        Returns an (H, W, 3) uint8 array whose block-band rows are filled in;
+        margin rows are never written, so their pages stay uncommitted, and
+        decompression stops after the last band. Returns None when streaming
+        does not apply (Numba missing, or the file is not the plain 8-bit RGB
+        non-interlaced PNG the encoder writes) so the caller can fall back to
+        a full PIL decode.
+        """
+        if not HAVE_NUMBA:
+            return None
+
+        with open(input_file, 'rb') as f:
+            if f.read(8) != b'\x89PNG\r\n\x1a\n':
+                return None
+            length, ctype = struct.unpack('>I4s', f.read(8))
+            if ctype != b'IHDR':
+                return None
+            (width, height, bit_depth, color_type,
+             compression, filter_method, interlace) = struct.unpack('>IIBBBBB', f.read(length))
+            f.seek(4, 1)  # CRC
+            if (bit_depth, color_type, compression, filter_method, interlace) != (8, 2, 0, 0, 0):
+                return None
+
+            # Rows belonging to a block band (block rows plus the outline row)
+            period = self.BLOCK_HEIGHT + self.MARGIN
+            rows = np.arange(height)
+            keep = (rows >= self.MARGIN) & ((rows - self.MARGIN) % period <= self.BLOCK_HEIGHT)
+            if not keep.any():
+                return None
+            last_keep = int(np.nonzero(keep)[0][-1])
+
+            img = np.empty((height, width, 3), dtype=np.uint8)
+            row_size = 1 + width * 3
+            cur = np.zeros(width * 3, dtype=np.uint8)
+            prev = np.zeros(width * 3, dtype=np.uint8)
+            buf = bytearray()
+            row = 0
+            decomp = zlib.decompressobj()
+
+            def consume():
+                nonlocal buf, row, cur, prev
+                complete = min(len(buf) // row_size, height - row)
+                if complete == 0:
+                    return
+                lines = np.frombuffer(bytes(memoryview(buf)[:complete * row_size]),
+                                      dtype=np.uint8).reshape(complete, row_size)
+                for r in range(complete):
+                    cur[:] = lines[r, 1:]
+                    _unfilter_row(lines[r, 0], cur, prev)
+                    if keep[row]:
+                        img[row] = cur.reshape(width, 3)
+                    prev, cur = cur, prev
+                    row += 1
+                del buf[:complete * row_size]
+
+            while row <= last_keep:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                length, ctype = struct.unpack('>I4s', header)
+                if ctype == b'IEND':
+                    buf += decomp.flush()
+                    consume()
+                    break
+                if ctype != b'IDAT':
+                    f.seek(length + 4, 1)
+                    continue
+                buf += decomp.decompress(f.read(length))
+                f.seek(4, 1)  # CRC
+                consume()
+
+            if row <= last_keep:
+                return None  # truncated stream; let PIL report it
+            return img
+
     def decode_file(self, input_file, output_dir):
         """Decode an encoded PNG file"""
-        image = Image.open(input_file)
-        img_array = np.array(image)
-        
-        print(f"Image dimensions: {img_array.shape}")
-        print(f"Image dtype: {img_array.dtype}")
-        
+        img_array = self.load_block_rows(input_file)
+        if img_array is None:
+            image = Image.open(input_file)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')  # e.g. palette-indexed pages
+            image.load()
+            # asarray wraps the pixel data without the extra copy np.array
+            # makes; the decoder only ever reads from it
+            img_array = np.asarray(image)
+
         blocks_per_row = (self.PAGE_WIDTH - 2 * self.MARGIN) // (self.BLOCK_WIDTH + self.MARGIN)
-        
-        # Extract header block
-        x, y = self.MARGIN, self.MARGIN
-        header_colors = self.extract_colors(img_array, x, y)
-        print("Debug - Header colors:", header_colors)
-        header_bytes = self.colors_to_bytes(header_colors)
-        
+
+        # Extract header block (grid index 0)
+        xs, ys = self.block_origins([0], blocks_per_row)
+        self.check_bounds(img_array, xs, ys)
+        header_bytes = self.extract_colors(img_array, xs, ys).tobytes()
+
         filename, extension, filesize, num_blocks = self.parse_header(header_bytes)
         print(f"Decoding: {filename}.{extension}")
         print(f"Expected size: {filesize} bytes")
         print(f"Expected blocks: {num_blocks}")
-        
-        # Extract data blocks
-        data = bytearray()
-        block_count = 1  # Already processed header
-        x += self.BLOCK_WIDTH + self.MARGIN
-        
-        while block_count < num_blocks + 1:  # +1 for header
-            if x + self.BLOCK_WIDTH + self.MARGIN > self.PAGE_WIDTH:
-                x = self.MARGIN
-                y += self.BLOCK_HEIGHT + self.MARGIN
-                
-            colors = self.extract_colors(img_array, x, y)
-            block_bytes = self.colors_to_bytes(colors)
-            data.extend(block_bytes)
-            
-            x += self.BLOCK_WIDTH + self.MARGIN
-            block_count += 1
-            
-            if block_count % 100 == 0:
-                print(f"Processed {block_count} blocks...")
-        
+
+        # Extract all data blocks at once (grid indices 1..num_blocks),
+        # trimming the zero padding of the final block before conversion
+        xs, ys = self.block_origins(np.arange(1, num_blocks + 1), blocks_per_row)
+        self.check_bounds(img_array, xs, ys)
+        data = self.extract_colors(img_array, xs, ys).reshape(-1)[:filesize].tobytes()
+
         # Extract and verify footer
-        if x + self.BLOCK_WIDTH + self.MARGIN > self.PAGE_WIDTH:
-            x = self.MARGIN
-            y += self.BLOCK_HEIGHT + self.MARGIN
-            
-        footer_colors = self.extract_colors(img_array, x, y)
-        footer_bytes = self.colors_to_bytes(footer_colors)
-        
-        if not self.verify_footer(footer_bytes, data[:filesize], filename, extension):
+        xs, ys = self.block_origins([num_blocks + 1], blocks_per_row)
+        self.check_bounds(img_array, xs, ys)
+        footer_bytes = self.extract_colors(img_array, xs, ys).tobytes()
+
+        if not self.verify_footer(footer_bytes, data, filename, extension):
             raise ValueError("Footer verification failed - file may be corrupted")
-            
-        # Trim to actual file size
-        data = data[:filesize]
-        
+
         # Save decoded file
         output_file = os.path.join(output_dir, f"{filename}.{extension}")
         with open(output_file, 'wb') as f:
@@ -174,19 +355,38 @@ class ByteBlockDecoder:
             
         print(f"Successfully decoded file: {output_file}")
 
+    def decode_files(self, input_files, output_dir, workers=None):
+        """Decode multiple encoded PNG files concurrently.
+
+        PIL decoding and the NumPy reductions release the GIL, so threads
+        give near-linear scaling across pages.
+        """
+        workers = workers or os.cpu_count()
+
+        if HAVE_NUMBA:
+            # Initialize Numba's threading layer from the calling thread;
+            # first-touch from a worker thread can hang interpreter shutdown.
+            dummy = np.zeros((self.BLOCK_HEIGHT, self.BLOCK_WIDTH, 3), dtype=np.uint8)
+            self.extract_colors(dummy, [0], [0])
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(self.decode_file, path, output_dir)
+                           for path in input_files]:
+                future.result()
+
 def main():
     parser = argparse.ArgumentParser(description='Decode a visual byte block format back to original file')
-    parser.add_argument('input_file', help='Input PNG file to decode')
-    parser.add_argument('output_dir', help='Output directory for decoded file')
-    
+    parser.add_argument('input_files', nargs='+', help='Input PNG file(s) to decode')
+    parser.add_argument('output_dir', help='Output directory for decoded files')
+
     args = parser.parse_args()
-    
+
     try:
         if not os.path.exists(args.output_dir):
             os.makedirs(args.output_dir)
-            
+
         decoder = ByteBlockDecoder()
-        decoder.decode_file(args.input_file, args.output_dir)
+        decoder.decode_files(args.input_files, args.output_dir)
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
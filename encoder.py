@@ -5,6 +5,34 @@ import math
 import argparse
 import sys
 
+# 15-byte header/footer block layouts; multi-byte integers are big-endian
+HEADER_DTYPE = np.dtype([('name', 'S5'), ('ext', 'S4'), ('size', '3u1'), ('blocks', '3u1')])
+FOOTER_DTYPE = np.dtype([('name', 'S5'), ('ext', 'S4'), ('checksum', '6u1')])
+
+# Numba is optional; without it the encoder falls back to the NumPy path
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _draw_blocks(canvas, xs, ys, oy, ox, my, mx, sec, blocks):
+        """Paint the outline and section pixels of every block"""
+        for b in prange(len(xs)):
+            x0 = xs[b]
+            y0 = ys[b]
+            for p in range(len(oy)):
+                canvas[y0 + oy[p], x0 + ox[p], 0] = 0
+                canvas[y0 + oy[p], x0 + ox[p], 1] = 0
+                canvas[y0 + oy[p], x0 + ox[p], 2] = 0
+            for p in range(len(my)):
+                k = sec[p]
+                canvas[y0 + my[p], x0 + mx[p], 0] = blocks[b, 3 * k]
+                canvas[y0 + my[p], x0 + mx[p], 1] = blocks[b, 3 * k + 1]
+                canvas[y0 + my[p], x0 + mx[p], 2] = blocks[b, 3 * k + 2]
+
 class ByteBlockEncoder:
     def __init__(self):
         self.DPI = 2550
@@ -16,108 +44,138 @@ class ByteBlockEncoder:
         self.BLOCK_WIDTH = 300
         self.BLOCK_HEIGHT = 300
         self.INNER_SCALE = math.sqrt(0.5)  # For inner rectangle (half area)
-        
-    def rgb_from_bytes(self, bytes_data, offset):
-        """Convert 3 bytes to RGB color"""
-        return (bytes_data[offset], bytes_data[offset + 1], bytes_data[offset + 2])
-        
-    def draw_block(self, draw, x, y, bytes_data):
-        """Draw a single 15-byte block"""
+
+        # Every block shares the same geometry, so rasterize the outline and
+        # the five color sections once as boolean masks; drawing the whole
+        # grid is then six scatter assignments into the canvas.
+        outline_mask, masks = self.build_masks()
+        self.outline_idx = np.nonzero(outline_mask)
+        self.section_idx = [np.nonzero(mask) for mask in masks]
+
+        # Flattened section coordinates for the Numba kernel, in section
+        # order so overlapping pixels resolve like sequential writes
+        self.flat_idx = (
+            np.concatenate([idx[0] for idx in self.section_idx]),
+            np.concatenate([idx[1] for idx in self.section_idx]),
+            np.concatenate([np.full(len(idx[0]), k, dtype=np.int64)
+                            for k, idx in enumerate(self.section_idx)]),
+        )
+
+    def build_masks(self):
+        """Rasterize the block outline and its five sections as boolean masks"""
         width = self.BLOCK_WIDTH
         height = self.BLOCK_HEIGHT
-        
+
         # Calculate inner rectangle dimensions
         inner_width = int(width * self.INNER_SCALE)
         inner_height = int(height * self.INNER_SCALE)
-        inner_x = x + (width - inner_width) // 2
-        inner_y = y + (height - inner_height) // 2
-        
-        # Draw outer rectangle
-        draw.rectangle([x, y, x + width, y + height], outline='black')
-        
-        # Draw trapezoids with colors from bytes (3 bytes per trapezoid)
-        # Top trapezoid
-        draw.polygon([
-            (x, y),
-            (x + width, y),
-            (inner_x + inner_width, inner_y),
-            (inner_x, inner_y)
-        ], fill=self.rgb_from_bytes(bytes_data, 0))
-        
-        # Bottom trapezoid
-        draw.polygon([
-            (x, y + height),
-            (x + width, y + height),
-            (inner_x + inner_width, inner_y + inner_height),
-            (inner_x, inner_y + inner_height)
-        ], fill=self.rgb_from_bytes(bytes_data, 3))
-        
-        # Right trapezoid
-        draw.polygon([
-            (x + width, y),
-            (x + width, y + height),
-            (inner_x + inner_width, inner_y + inner_height),
-            (inner_x + inner_width, inner_y)
-        ], fill=self.rgb_from_bytes(bytes_data, 6))
-        
-        # Left trapezoid
-        draw.polygon([
-            (x, y),
-            (x, y + height),
-            (inner_x, inner_y + inner_height),
-            (inner_x, inner_y)
-        ], fill=self.rgb_from_bytes(bytes_data, 9))
-        
+        inner_x = (width - inner_width) // 2
+        inner_y = (height - inner_height) // 2
+
+        sections = [
+            # Top trapezoid
+            [(0, 0), (width, 0), (inner_x + inner_width, inner_y), (inner_x, inner_y)],
+            # Bottom trapezoid
+            [(0, height), (width, height),
+             (inner_x + inner_width, inner_y + inner_height), (inner_x, inner_y + inner_height)],
+            # Right trapezoid
+            [(width, 0), (width, height),
+             (inner_x + inner_width, inner_y + inner_height), (inner_x + inner_width, inner_y)],
+            # Left trapezoid
+            [(0, 0), (0, height), (inner_x, inner_y + inner_height), (inner_x, inner_y)],
+        ]
+
+        # Rectangles and polygons include both endpoints, so masks span
+        # (height + 1, width + 1) pixels
+        outline = Image.new('1', (width + 1, height + 1), 0)
+        ImageDraw.Draw(outline).rectangle([0, 0, width, height], outline=1)
+        masks = []
+        for polygon in sections:
+            mask = Image.new('1', (width + 1, height + 1), 0)
+            ImageDraw.Draw(mask).polygon(polygon, fill=1)
+            masks.append(np.array(mask, dtype=bool))
+
         # Inner rectangle
-        draw.rectangle(
-            [inner_x, inner_y, inner_x + inner_width, inner_y + inner_height],
-            fill=self.rgb_from_bytes(bytes_data, 12)
-        )
-        
-        return width, height
+        mask = Image.new('1', (width + 1, height + 1), 0)
+        ImageDraw.Draw(mask).rectangle(
+            [inner_x, inner_y, inner_x + inner_width, inner_y + inner_height], fill=1)
+        masks.append(np.array(mask, dtype=bool))
+
+        return np.array(outline, dtype=bool), masks
+
+    def draw_blocks(self, canvas, xs, ys, blocks):
+        """Paint every 15-byte block onto the canvas, one scatter per section.
+
+        xs and ys are (N,) arrays of block origins and blocks is an (N, 15)
+        uint8 array; each of the five sections is written for all blocks in
+        a single fancy-indexed assignment.
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        oy, ox = self.outline_idx
+
+        if HAVE_NUMBA:
+            my, mx, sec = self.flat_idx
+            _draw_blocks(canvas, xs.astype(np.int64), ys.astype(np.int64),
+                         oy, ox, my, mx, sec, blocks)
+            return
+
+        xs = xs[:, None]
+        ys = ys[:, None]
+
+        # Outer rectangle outline, then the five color sections (3 bytes each)
+        canvas[ys + oy, xs + ox] = 0
+        for k, (my, mx) in enumerate(self.section_idx):
+            canvas[ys + my, xs + mx] = blocks[:, 3*k:3*k+3][:, None, :]
+
+    def draw_blocks_indexed(self, canvas, xs, ys, blocks_idx, outline_index):
+        """Paint every block as palette indices on a single-channel canvas.
+
+        Same layout as draw_blocks, but blocks_idx is (N, 5) palette indices
+        and each pixel is a single byte."""
+        xs = np.asarray(xs)[:, None]
+        ys = np.asarray(ys)[:, None]
+
+        oy, ox = self.outline_idx
+        canvas[ys + oy, xs + ox] = outline_index
+        for k, (my, mx) in enumerate(self.section_idx):
+            canvas[ys + my, xs + mx] = blocks_idx[:, k][:, None]
         
-    def create_header_block(self, filename, filesize, num_blocks):
+    def block_origins(self, indices):
+        """Pixel origins of the blocks at the given grid indices"""
+        blocks_per_row = (self.PAGE_WIDTH - 2 * self.MARGIN) // (self.BLOCK_WIDTH + self.MARGIN)
+        rows, cols = np.divmod(np.asarray(indices), blocks_per_row)
+        xs = self.MARGIN + cols * (self.BLOCK_WIDTH + self.MARGIN)
+        ys = self.MARGIN + rows * (self.BLOCK_HEIGHT + self.MARGIN)
+        return xs, ys
+
+    def create_header_block(self, name, ext, filesize, num_blocks):
         """Create 15-byte header block"""
-        header = bytearray(15)
-        
-        # First 5 bytes: start of filename
-        name = os.path.splitext(filename)[0][:5].encode()
-        header[:len(name)] = name
-        
-        # Next 4 bytes: extension
-        ext = os.path.splitext(filename)[1][1:].encode()[:4]
-        header[5:5+len(ext)] = ext
-        
-        # 3 bytes for filesize
-        header[9] = (filesize >> 16) & 0xFF
-        header[10] = (filesize >> 8) & 0xFF
-        header[11] = filesize & 0xFF
-        
-        # 3 bytes for number of blocks
-        header[12] = (num_blocks >> 16) & 0xFF
-        header[13] = (num_blocks >> 8) & 0xFF
-        header[14] = num_blocks & 0xFF
-        
-        return header
-        
-    def create_footer_block(self, filename, data):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+
+        # Start of filename (5 bytes) and extension (4 bytes)
+        header['name'] = name[:5].encode()
+        header['ext'] = ext[1:].encode()[:4]
+
+        # 3 bytes each for filesize and number of blocks
+        header['size'] = np.frombuffer(filesize.to_bytes(3, 'big'), dtype=np.uint8)
+        header['blocks'] = np.frombuffer(num_blocks.to_bytes(3, 'big'), dtype=np.uint8)
+
+        return header.view(np.uint8)
+
+    def create_footer_block(self, name, ext, data):
         """Create 15-byte footer block"""
-        footer = bytearray(15)
-        
-        # Last 5 bytes of filename
-        name = os.path.splitext(filename)[0][-5:].encode()
-        footer[:len(name)] = name
-        
-        # Extension (4 bytes)
-        ext = os.path.splitext(filename)[1][1:].encode()[:4]
-        footer[5:5+len(ext)] = ext
-        
+        footer = np.zeros(1, dtype=FOOTER_DTYPE)
+
+        # Last 5 bytes of filename and extension (4 bytes)
+        footer['name'] = name[-5:].encode()
+        footer['ext'] = ext[1:].encode()[:4]
+
         # Checksum (6 bytes)
-        checksum = sum(data) & 0xFFFFFFFFFFFF
-        for i in range(6):
-            footer[9+i] = (checksum >> (40 - i*8)) & 0xFF
-            
-        return footer
+        checksum = int(np.frombuffer(data, dtype=np.uint8).sum(dtype=np.uint64)) & 0xFFFFFFFFFFFF
+        footer['checksum'] = np.frombuffer(checksum.to_bytes(6, 'big'), dtype=np.uint8)
+
+        return footer.view(np.uint8)
 
     def encode_file(self, input_file, output_path):
         """Encode a file into the block format"""
@@ -127,58 +185,52 @@ class ByteBlockEncoder:
         # Calculate number of blocks needed (15 bytes per block)
         num_blocks = (len(data) + 14) // 15
         
+        # Split the filename once; header, footer, and output naming reuse it
+        name, ext = os.path.splitext(os.path.basename(input_file))
+
         # Create header and footer
-        header_block = self.create_header_block(os.path.basename(input_file), len(data), num_blocks)
-        footer_block = self.create_footer_block(os.path.basename(input_file), data)
-        
-        # Create image
-        img = Image.new('RGB', (self.PAGE_WIDTH, self.PAGE_HEIGHT), 'white')
-        draw = ImageDraw.Draw(img)
-        
+        header_block = self.create_header_block(name, ext, len(data), num_blocks)
+        footer_block = self.create_footer_block(name, ext, data)
+        
+        # Assemble all 15-byte blocks: header, data, footer
+        blocks = np.zeros((num_blocks + 2, 15), dtype=np.uint8)
+        blocks[0] = header_block
+        blocks[1:-1].reshape(-1)[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        blocks[-1] = footer_block
+
         # Calculate grid layout
-        blocks_per_row = (self.PAGE_WIDTH - 2 * self.MARGIN) // (self.BLOCK_WIDTH + self.MARGIN)
-        
-        # Process blocks
-        x, y = self.MARGIN, self.MARGIN
-        block_count = 0
-        
-        # Draw header
-        self.draw_block(draw, x, y, header_block)
-        x += self.BLOCK_WIDTH + self.MARGIN
-        block_count += 1
-        
-        # Draw data blocks
-        for i in range(0, len(data), 15):
-            if x + self.BLOCK_WIDTH + self.MARGIN > self.PAGE_WIDTH:
-                x = self.MARGIN
-                y += self.BLOCK_HEIGHT + self.MARGIN
-                
-            if y + self.BLOCK_HEIGHT + self.MARGIN > self.PAGE_HEIGHT:
-                raise ValueError("File too large to fit on single page")
-                
-            block = bytearray(15)
-            block[:min(15, len(data)-i)] = data[i:i+15]
-            self.draw_block(draw, x, y, block)
-            
-            x += self.BLOCK_WIDTH + self.MARGIN
-            block_count += 1
-            
-        # Draw footer
-        if x + self.BLOCK_WIDTH + self.MARGIN > self.PAGE_WIDTH:
-            x = self.MARGIN
-            y += self.BLOCK_HEIGHT + self.MARGIN
-            
-        self.draw_block(draw, x, y, footer_block)
-        
+        xs, ys = self.block_origins(np.arange(num_blocks + 2))
+        if ys[-1] + self.BLOCK_HEIGHT + self.MARGIN > self.PAGE_HEIGHT:
+            raise ValueError("File too large to fit on single page")
+
+        # When the distinct colors (sections plus outline and background) fit
+        # in a byte, draw palette indices on a single-channel canvas: a third
+        # of the memory and PNG payload. Otherwise draw full RGB.
+        palette, inverse = np.unique(
+            np.vstack([[[0, 0, 0], [255, 255, 255]], blocks.reshape(-1, 3)]),
+            axis=0, return_inverse=True)
+        if len(palette) <= 256:
+            black_index, white_index = inverse[0], inverse[1]
+            blocks_idx = inverse[2:].reshape(-1, 5).astype(np.uint8)
+            canvas = np.full((self.PAGE_HEIGHT, self.PAGE_WIDTH), white_index, dtype=np.uint8)
+            self.draw_blocks_indexed(canvas, xs, ys, blocks_idx, black_index)
+            img = Image.fromarray(canvas, mode='P')
+            img.putpalette(palette.astype(np.uint8).reshape(-1))
+        else:
+            canvas = np.full((self.PAGE_HEIGHT, self.PAGE_WIDTH, 3), 255, dtype=np.uint8)
+            self.draw_blocks(canvas, xs, ys, blocks)
+            img = Image.fromarray(canvas)
+
         # Save the image
         output_file = output_path
         if os.path.isdir(output_path):
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = os.path.join(output_path, f"{base_name}_encoded.png")
+            output_file = os.path.join(output_path, f"{name}_encoded.png")
         elif not output_file.lower().endswith('.png'):
             output_file += '.png'
             
-        img.save(output_file, 'PNG', dpi=(self.DPI, self.DPI))
+        # compress_level=1 trades a slightly larger file for a much faster
+        # deflate pass; the page is mostly flat color and still shrinks well
+        img.save(output_file, 'PNG', dpi=(self.DPI, self.DPI), compress_level=1)
         return output_file
 
 def main():